@@ -1,12 +1,38 @@
+import json
 from sqlmodel import SQLModel, create_engine, Session
 
 sqlite_file_name = "med-it-easy.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+def _json_serializer(obj) -> str:
+    # Compact, and store Chinese text as UTF-8 rather than 6-byte \uXXXX escapes.
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+# Requests can hold a connection for a long time (e.g. while waiting on Gemini),
+# so allow more than the default 5 + 10 connections before callers queue.
+engine = create_engine(
+    sqlite_url,
+    connect_args={"check_same_thread": False},
+    json_serializer=_json_serializer,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+
+_schema_ready = False
 
 def create_db_and_tables():
+    # Schema checks issue a PRAGMA per table and index, so only run them once per process.
+    global _schema_ready
+    if _schema_ready:
+        return
     SQLModel.metadata.create_all(engine)
+    # create_all skips indexes on tables that already exist, so add any new ones here.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    _schema_ready = True
 
 def get_session():
     with Session(engine) as session:
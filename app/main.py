@@ -1,3 +1,8 @@
+# 在匯入任何模組之前讀取一次 .env，模組層級的設定值（如 CARD_IMAGE_FORMAT）與 Gemini 金鑰才讀得到
+from dotenv import load_dotenv
+
+load_dotenv()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,10 +10,12 @@ from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 from .database import create_db_and_tables
 from .routers import ai, appointment, analysis, user, medical_records, symptoms
+from .services import skin_tone
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    skin_tone.warm_up()
     print("Starting Service...")
     yield
     print("Shutting Down Service...")
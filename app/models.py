@@ -1,6 +1,6 @@
 from sqlmodel import SQLModel, Field, Relationship, Text
-from sqlalchemy import Column, Integer, ForeignKey, JSON
-from typing import Optional, List
+from sqlalchemy import Column, Integer, ForeignKey, Index, JSON
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -75,7 +75,10 @@ class Appointment(SQLModel, table=True):
     )
     
     # Links to chat logs and medical records
-    chat_logs: List["ChatLog"] = Relationship(back_populates="appointment")
+    chat_logs: List["ChatLog"] = Relationship(
+        back_populates="appointment",
+        sa_relationship_kwargs={"order_by": "ChatLog.created_at"}
+    )
     symptom: Optional["Symptom"] = Relationship(back_populates="appointment")
     medical_record: Optional["MedicalRecord"] = Relationship(back_populates="appointment")
 
@@ -83,6 +86,8 @@ class Appointment(SQLModel, table=True):
 class ChatLog(SQLModel, table=True):
     """Stores the chat history from the AI interview."""
     __tablename__ = "chat_logs"
+    # The chat endpoint reads history per appointment in created_at order.
+    __table_args__ = (Index("ix_chat_logs_appointment_id_created_at", "appointment_id", "created_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     appointment_id: int = Field(sa_column=Column(Integer, ForeignKey("appointments.id", ondelete="CASCADE")))
@@ -145,7 +150,7 @@ class AnalysisRecord(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     patient_id: int = Field(sa_column=Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True))
     analysis_type: str = Field(index=True, description="Type of analysis (e.g., skin_tone)")
-    analysis_result: str = Field(sa_type=Text, description="Serialized JSON/text payload")
+    analysis_result: Dict[str, Any] = Field(sa_column=Column(JSON), description="JSON payload of the analysis")
     created_at: datetime = Field(default_factory=datetime.now)
 
     # Relationship
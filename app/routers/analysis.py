@@ -1,5 +1,6 @@
-import base64
-import json
+import asyncio
+import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -20,6 +21,51 @@ ASSETS_DIR = Path(__file__).resolve().parent.parent / "assets"
 CARD_TEMPLATE = ASSETS_DIR / "cardd.png"
 CARD_FONT = ASSETS_DIR / "Iansui-Regular.ttf"
 LLM_PLACEHOLDER = "保持規律作息、補充水分並記得防曬，下一次回診一起檢視膚況。"
+# Face Mesh landmarks are normalized, so larger inputs only add decode/analysis work.
+MAX_IMAGE_SIDE = 1024
+# PNG (default) or WEBP; the response carries the matching analysis_card_mime_type.
+CARD_IMAGE_FORMAT = os.getenv("CARD_IMAGE_FORMAT", "PNG").upper()
+# Fail at startup rather than on every upload when the setting is misspelled.
+if CARD_IMAGE_FORMAT not in SkinToneCardGenerator.ENCODE_OPTIONS:
+    raise ValueError(
+        f"Unsupported CARD_IMAGE_FORMAT {CARD_IMAGE_FORMAT!r}; "
+        f"expected one of {', '.join(SkinToneCardGenerator.ENCODE_OPTIONS)}"
+    )
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    # Starlette has already spooled the multipart body by now; reading in chunks only keeps
+    # an oversized upload from being materialized in memory as a single bytes object.
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="上傳的影像過大（上限 10 MB）")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _decode_and_resize(file_bytes: bytes) -> Optional[np.ndarray]:
+    nparr = np.frombuffer(file_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    h, w = img.shape[:2]
+    scale = MAX_IMAGE_SIDE / max(h, w)
+    if scale < 1:
+        new_w, new_h = max(int(w * scale), 1), max(int(h * scale), 1)
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return img
+
+
+@lru_cache(maxsize=4)
+def _get_generator(template: str, font: str, image_format: str) -> SkinToneCardGenerator:
+    # The generator only reads its template/font, so one instance can serve every request.
+    return SkinToneCardGenerator(template, font, image_format)
 
 
 class AnalysisRecordPublic(BaseModel):
@@ -47,17 +93,18 @@ async def analyze_skin_tone(
     if not patient or patient.role != UserRole.PATIENT:
         raise HTTPException(status_code=404, detail="找不到此患者")
 
+    file_bytes = await _read_upload(file)
     try:
-        file_bytes = await file.read()
-        nparr = np.frombuffer(file_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        img = await asyncio.to_thread(_decode_and_resize, file_bytes)
     except Exception:
         raise HTTPException(status_code=400, detail="無法讀取上傳的影像")
 
     if img is None:
         raise HTTPException(status_code=400, detail="影像解碼失敗或格式不支援")
 
-    analysis = analyze_face_color(img)
+    # FaceMesh inference is CPU-bound; run it off the event loop so the FaceMesh pool serves
+    # concurrent uploads and other endpoints stay responsive.
+    analysis = await asyncio.to_thread(analyze_face_color, img)
     if analysis.get("status") != "analysis_complete":
         raise HTTPException(status_code=400, detail=analysis.get("message", "分析失敗"))
 
@@ -84,13 +131,12 @@ async def analyze_skin_tone(
     diagnosis_text = f"{result.get('explanation', '')} {result.get('advice', '')}".strip()
 
     try:
-        generator = SkinToneCardGenerator(CARD_TEMPLATE, CARD_FONT)
-        rose_base64 = analysis.get("_analysis_rose_plot_base64")
-        if not rose_base64:
+        generator = _get_generator(str(CARD_TEMPLATE), str(CARD_FONT), CARD_IMAGE_FORMAT)
+        rose_image = analysis.get("_analysis_rose_plot_image")
+        if rose_image is None:
             raise HTTPException(status_code=500, detail="缺少玫瑰圖資料，無法生成卡片")
-        rose_bytes = base64.b64decode(rose_base64)
         analysis_card_base64 = generator.generate_card(
-            rose_chart_bytes=rose_bytes,
+            rose_chart=rose_image,
             diagnosis_text=diagnosis_text,
             appointment_fields=appointment_fields,
             llm_advice=LLM_PLACEHOLDER,
@@ -104,6 +150,7 @@ async def analyze_skin_tone(
         "result": result,
         "appointment_context": appointment_fields,
         "analysis_card_base64": analysis_card_base64,
+        "analysis_card_mime_type": generator.mime_type,
     }
     # 存 DB 的精簡版（不存 base64）
     analysis_result_db = {
@@ -115,7 +162,7 @@ async def analyze_skin_tone(
     record = AnalysisRecord(
         patient_id=patient_id,
         analysis_type="skin_tone",
-        analysis_result=json.dumps(analysis_result_db),
+        analysis_result=analysis_result_db,
     )
     session.add(record)
     session.commit()
@@ -147,7 +194,7 @@ def list_records(
             "id": r.id,
             "patient_id": r.patient_id,
             "analysis_type": r.analysis_type,
-            "analysis_result": json.loads(r.analysis_result or "{}"),
+            "analysis_result": r.analysis_result or {},
             "created_at": r.created_at.isoformat(),
         }
         for r in records
@@ -163,6 +210,6 @@ def get_record(record_id: int, session: Session = Depends(get_session)):
         "id": record.id,
         "patient_id": record.patient_id,
         "analysis_type": record.analysis_type,
-        "analysis_result": json.loads(record.analysis_result or "{}"),
+        "analysis_result": record.analysis_result or {},
         "created_at": record.created_at.isoformat(),
     }
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy import update
 from sqlmodel import SQLModel, Session, select
 from typing import Optional
 from datetime import datetime
 
-from ..database import get_session
+from ..database import engine, get_session
 from ..models import (
     MedicalRecord,
     Appointment,
@@ -38,28 +39,45 @@ class MedicalRecordPublic(MedicalRecordBase):
     created_at: datetime
 
 
+async def _fill_ai_summary(record_id: int, appointment_id: int) -> None:
+    """背景任務：呼叫 Gemini 產生摘要後回填病歷（使用獨立的 session）"""
+    with Session(engine) as session:
+        ai_summary, ai_disease_prediction, ai_advice = await generate_ai_summary(appointment_id, session)
+
+        db_record = session.get(MedicalRecord, record_id)
+        if not db_record:  # 生成期間病歷已被刪除
+            return
+        db_record.ai_summary = ai_summary
+        db_record.ai_disease_prediction = ai_disease_prediction
+        db_record.ai_advice = ai_advice
+
+        session.add(db_record)
+        session.commit()
+
+
 # =============================
 # ✔ POST: 新增病歷
 # =============================
-@router.post("/", response_model=MedicalRecordPublic)
-def create_record(record_data: MedicalRecordCreate, session: Session = Depends(get_session)):
+@router.post("/", response_model=MedicalRecordPublic, status_code=202)
+def create_record(
+    record_data: MedicalRecordCreate,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+):
 
     # 確認 appointment 是否存在
     appointment = session.get(Appointment, record_data.appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="找不到 appointment")
 
-    # 生成 AI summary 和 prediction
-    ai_summary, ai_disease_prediction, ai_advice = generate_ai_summary(record_data.appointment_id, session)
-
+    # 先建立病歷（AI 欄位為空 = 生成中），立即回傳
     db_record = MedicalRecord.model_validate(record_data)
-    db_record.ai_summary = ai_summary
-    db_record.ai_disease_prediction = ai_disease_prediction
-    db_record.ai_advice = ai_advice
-
     session.add(db_record)
     session.commit()
     session.refresh(db_record)
+
+    # AI summary 和 prediction 在回應送出後於背景生成，完成後可用 GET 查詢
+    background_tasks.add_task(_fill_ai_summary, db_record.id, record_data.appointment_id)
     return db_record
 
 
@@ -70,7 +88,7 @@ def create_record(record_data: MedicalRecordCreate, session: Session = Depends(g
 def get_record_by_appointment(appointment_id: int, session: Session = Depends(get_session)):
     record = session.exec(
         select(MedicalRecord).where(MedicalRecord.appointment_id == appointment_id)
-    ).first()
+    ).one_or_none()
 
     if not record:
         raise HTTPException(status_code=404, detail="找不到病歷")
@@ -91,10 +109,12 @@ def update_diagnosis(record_id: int, record_data: MedicalRecordUpdate, session:
     for key, value in update_data.items():
         setattr(db_record, key, value)
 
-    # **重點：該 appointment 設為 COMPLETED**
-    appointment = session.get(Appointment, db_record.appointment_id)
-    appointment.status = AppointmentStatus.COMPLETED
-    session.add(appointment)
+    # **重點：該 appointment 設為 COMPLETED**（直接 UPDATE，不先查出 appointment）
+    session.exec(
+        update(Appointment)
+        .where(Appointment.id == db_record.appointment_id)
+        .values(status=AppointmentStatus.COMPLETED)
+    )
 
     session.add(db_record)
     session.commit()
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
+from datetime import datetime
 from ..database import get_session
 from ..models import Symptom, Appointment
 
@@ -19,6 +22,8 @@ class SymptomCreate(BaseModel):
 
 # Response
 class SymptomPublic(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     appointment_id: int
     description: str
@@ -27,7 +32,7 @@ class SymptomPublic(BaseModel):
     severity: str
     notes: Optional[str] = None
     analysis_record_id: Optional[int] = None
-    created_at: str
+    created_at: datetime  # 以 ISO 8601 字串輸出
 
 
 @router.post("/", response_model=SymptomPublic)
@@ -41,8 +46,10 @@ def submit_symptom(data: SymptomCreate, session: Session = Depends(get_session))
         raise HTTPException(status_code=404, detail="找不到此預約")
 
     # 檢查是否已經填寫過
-    existing = session.exec(select(Symptom).where(Symptom.appointment_id == data.appointment_id)).first()
-    if existing:
+    already_submitted = session.exec(
+        select(exists().where(Symptom.appointment_id == data.appointment_id))
+    ).one()
+    if already_submitted:
         raise HTTPException(status_code=400, detail="此預約已提交過症狀報告")
 
     new_symptom = Symptom(
@@ -56,20 +63,15 @@ def submit_symptom(data: SymptomCreate, session: Session = Depends(get_session))
     )
     
     session.add(new_symptom)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # appointment_id 有唯一索引，並發提交時由資料庫擋下重複
+        session.rollback()
+        raise HTTPException(status_code=400, detail="此預約已提交過症狀報告")
     session.refresh(new_symptom)
     
-    return SymptomPublic(
-        id=new_symptom.id,
-        appointment_id=new_symptom.appointment_id,
-        description=new_symptom.description,
-        symptoms=new_symptom.symptoms,
-        duration=new_symptom.duration,
-        severity=new_symptom.severity,
-        notes=new_symptom.notes,
-        analysis_record_id=new_symptom.analysis_record_id,
-        created_at=new_symptom.created_at.isoformat()
-    )
+    return SymptomPublic.model_validate(new_symptom)
 
 @router.get("/{appointment_id}", response_model=SymptomPublic)
 def get_symptom(appointment_id: int, session: Session = Depends(get_session)):
@@ -81,14 +83,4 @@ def get_symptom(appointment_id: int, session: Session = Depends(get_session)):
     if not symptom:
         raise HTTPException(status_code=404, detail="此預約尚未填寫症狀")
         
-    return SymptomPublic(
-        id=symptom.id,
-        appointment_id=symptom.appointment_id,
-        description=symptom.description,
-        symptoms=symptom.symptoms,
-        duration=symptom.duration,
-        severity=symptom.severity,
-        notes=symptom.notes,
-        analysis_record_id=symptom.analysis_record_id,
-        created_at=symptom.created_at.isoformat()
-    )
\ No newline at end of file
+    return SymptomPublic.model_validate(symptom)
\ No newline at end of file
@@ -1,59 +1,15 @@
 from sqlmodel import Session, select
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
 import json
-from ..models import Symptom, ChatLog
+import textwrap
+from functools import lru_cache
+from sqlalchemy.orm import joinedload
+from ..models import Appointment
 import os
 import google.generativeai as genai
-from dotenv import load_dotenv
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel('gemini-2.0-flash')
-
-def generate_ai_summary(appointment_id: int, session: Session) -> Tuple[str, str]:
-    ai_summary = None
-    ai_disease_prediction = None
-    
-    try:
-        # 1. 收集症狀資料
-        symptom = session.exec(
-            select(Symptom).where(Symptom.appointment_id == appointment_id)
-        ).first()
-
-        # 2. 收集對話歷史
-        chat_logs = session.exec(
-            select(ChatLog)
-            .where(ChatLog.appointment_id == appointment_id)
-            .order_by(ChatLog.created_at)
-        ).all()
-
-        # 3. 組合資料給 AI
-        context_parts = []
-
-        if symptom:
-            symptom_info = f"""
-            【症狀報告】
-            症狀描述: {symptom.description}
-            症狀清單: {', '.join(symptom.symptoms)}
-            持續時間: {symptom.duration}
-            嚴重程度: {symptom.severity}
-            """
-            if symptom.notes:
-                symptom_info += f"備註: {symptom.notes}\n"
-            context_parts.append(symptom_info)
-
-        if chat_logs:
-            chat_history = "\n【對話歷史】\n"
-            for log in chat_logs:
-                role_name = "病患" if log.sender_role == "patient" else "AI助手"
-                chat_history += f"{role_name}: {log.content}\n"
-            context_parts.append(chat_history)
-
-        # 只有在有資料時才呼叫 AI
-        if context_parts:
-            full_context = "\n".join(context_parts)
-
-            system_prompt = """
+SYSTEM_PROMPT = textwrap.dedent("""
             你是一位專業的醫療 AI 助手。
             請根據提供的症狀報告和對話歷史,完成以下任務並以 JSON 格式回傳:
 
@@ -82,36 +38,181 @@ def generate_ai_summary(appointment_id: int, session: Session) -> Tuple[str, str
             "disease_prediction": "初步推測為..."
             "advice": "建議..."
             }
-            """
+            """).strip()
+
+@lru_cache(maxsize=1)
+def _get_model() -> genai.GenerativeModel:
+    # 第一次呼叫時才設定 Gemini；.env 已由 app.main 在啟動時載入
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    # 固定的系統指令放在 system_instruction，每次請求只需送出病患資料，
+    # 相同前綴也能被 Gemini 的隱式快取重用。
+    return genai.GenerativeModel('gemini-2.0-flash', system_instruction=SYSTEM_PROMPT)
+
+# 沒有症狀報告也沒有病患訊息時不呼叫 AI，直接回傳此預設值
+INSUFFICIENT_CONTEXT_RESULT = ("症狀資訊不足", "待觀察", "請提供更多資訊")
+
+# 微批次：短時間內的多筆摘要請求合併成一次 Gemini 呼叫。
+# 每筆請求最多多等 BATCH_WINDOW_SECONDS，預設關閉。
+BATCH_ENABLED = os.getenv("AI_SUMMARY_BATCHING", "0") == "1"
+BATCH_MAX_SIZE = 8
+BATCH_WINDOW_SECONDS = 0.25
+# 等待批次結果的上限，需大於一次 Gemini 呼叫的時間，避免批次器異常時永久卡住
+BATCH_RESULT_TIMEOUT_SECONDS = 120
+
+# 要求 Gemini 直接輸出符合 schema 的 JSON，不需再清理 Markdown 封裝
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "disease_prediction": {"type": "string"},
+        "advice": {"type": "string"},
+    },
+    "required": ["summary", "disease_prediction", "advice"],
+}
+SUMMARY_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": SUMMARY_SCHEMA}
+BATCH_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "array", "items": SUMMARY_SCHEMA},
+}
+
+_batch_queue: Optional[asyncio.Queue] = None
+_batcher_task: Optional[asyncio.Task] = None
+# 保留背景批次任務的強參考，避免尚未完成就被垃圾回收
+_batch_tasks: Set[asyncio.Task] = set()
+
+
+async def _generate_single(full_context: str) -> Dict[str, Any]:
+    response = await _get_model().generate_content_async(
+        f"{full_context}\n\n請提供分析結果:", generation_config=SUMMARY_GENERATION_CONFIG
+    )
+    return json.loads(response.text)
+
+
+async def _run_batch(items: List[Tuple[str, asyncio.Future]]) -> None:
+    if len(items) == 1:
+        full_context, future = items[0]
+        try:
+            result = await _generate_single(full_context)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        # 呼叫端可能已取消等待（例如關機時取消背景任務）
+        if not future.done():
+            future.set_result(result)
+        return
+
+    cases = "".join(
+        f"\n===CASE {i}===\n{full_context}\n" for i, (full_context, _) in enumerate(items)
+    )
+    prompt = (
+        f"以下共有 {len(items)} 個病例。請回傳長度為 {len(items)} 的 JSON 陣列，"
+        f"第 i 個元素為第 i 個病例 (CASE i) 的分析結果 JSON 物件:\n{cases}\n請提供分析結果:"
+    )
+    try:
+        response = await _get_model().generate_content_async(prompt, generation_config=BATCH_GENERATION_CONFIG)
+        results = json.loads(response.text)
+        if len(results) != len(items):
+            raise ValueError(f"批次回應數量不符: 預期 {len(items)} 筆")
+        for (_, future), result in zip(items, results):
+            # 已取消的呼叫端不影響同批其他請求取得結果
+            if not future.done():
+                future.set_result(result)
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+
+
+async def _batcher(queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_SECONDS
+        while len(items) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 不等待這一批完成，讓下一個時間窗可以立即開始收集
+        task = asyncio.create_task(_run_batch(items))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
 
-            full_prompt = (
-                f"{system_prompt}\n\n{full_context}\n\n請提供分析結果:"
-            )
 
-            # 呼叫 AI
-            response = model.generate_content(full_prompt)
-            ai_reply = response.text.strip()
+async def _request_summary(full_context: str) -> Dict[str, Any]:
+    """回傳 Gemini 對單一病例的分析結果 (summary / disease_prediction / advice)"""
+    if not BATCH_ENABLED:
+        return await _generate_single(full_context)
 
-            # 清理 Markdown 封裝
-            if ai_reply.startswith("```json"):
-                ai_reply = ai_reply.removeprefix("```json").lstrip()
-            if ai_reply.endswith("```"):
-                ai_reply = ai_reply.removesuffix("```").rstrip()
+    global _batch_queue, _batcher_task
+    loop = asyncio.get_running_loop()
+    # 第一次使用、批次器已結束，或換了 event loop（例如測試）時重新建立
+    if _batcher_task is None or _batcher_task.done() or _batcher_task.get_loop() is not loop:
+        _batch_queue = asyncio.Queue()
+        _batcher_task = asyncio.create_task(_batcher(_batch_queue))
 
-            # 解析 JSON
-            try:
-                result = json.loads(ai_reply)
-                ai_summary = result.get("summary", "")
-                ai_disease_prediction = result.get(
-                    "disease_prediction", "待觀察"
-                )
-                ai_advice = result.get("advice", "")
-            except json.JSONDecodeError as e:
-                # 解析失敗時使用預設值
-                print(f"[JSON 解析錯誤] {e}")
-                ai_summary = "AI 摘要生成失敗"
-                ai_disease_prediction = "待觀察"
-                ai_advice = "建議生成失敗"
+    future = loop.create_future()
+    await _batch_queue.put((full_context, future))
+    return await asyncio.wait_for(future, BATCH_RESULT_TIMEOUT_SECONDS)
+
+
+async def generate_ai_summary(appointment_id: int, session: Session) -> Tuple[str, str, str]:
+    ai_summary = None
+    ai_disease_prediction = None
+    ai_advice = None
+    
+    try:
+        # 1. 一次查詢取得症狀資料與對話歷史（依 created_at 排序）
+        appointment = session.exec(
+            select(Appointment)
+            .where(Appointment.id == appointment_id)
+            .options(joinedload(Appointment.symptom), joinedload(Appointment.chat_logs))
+        ).unique().first()
+        symptom = appointment.symptom if appointment else None
+        chat_logs = appointment.chat_logs if appointment else []
+
+        # 病患完全沒有提供資料時不呼叫 Gemini；中文症狀報告字數本來就少，不以字數判斷
+        has_patient_message = any(
+            log.sender_role == "patient" and log.content.strip() for log in chat_logs
+        )
+        if symptom is None and not has_patient_message:
+            return INSUFFICIENT_CONTEXT_RESULT
+
+        # 2. 組合資料給 AI
+        context_parts = []
+
+        if symptom:
+            symptom_lines = [
+                "【症狀報告】",
+                f"症狀描述: {symptom.description}",
+                f"症狀清單: {', '.join(symptom.symptoms)}",
+                f"持續時間: {symptom.duration}",
+                f"嚴重程度: {symptom.severity}",
+            ]
+            if symptom.notes:
+                symptom_lines.append(f"備註: {symptom.notes}")
+            context_parts.append("\n".join(symptom_lines))
+
+        if chat_logs:
+            chat_lines = ["【對話歷史】"]
+            chat_lines += [
+                f"{'病患' if log.sender_role == 'patient' else 'AI助手'}: {log.content}"
+                for log in chat_logs
+            ]
+            context_parts.append("\n".join(chat_lines))
+
+        if context_parts:
+            full_context = "\n\n".join(context_parts)
+
+            # 呼叫 AI（非同步，等待回應時不阻塞其他請求；回應為結構化 JSON）
+            result = await _request_summary(full_context)
+            ai_summary = result.get("summary", "")
+            ai_disease_prediction = result.get("disease_prediction", "待觀察")
+            ai_advice = result.get("advice", "")
     except Exception as e:
         # 如果 AI 生成失敗,不影響病歷建立,只記錄錯誤
         print(f"AI 生成失敗: {str(e)}")
@@ -5,18 +5,26 @@ The functions here can be imported by FastAPI routers or background tasks
 without re-initializing heavy computer vision primitives.
 """
 
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 import base64
 import io
 import json
+import math
+import multiprocessing
+import operator
+import os
+import queue
 import re
+import threading
 from pathlib import Path
 
 import cv2
 import mediapipe as mp
-import matplotlib.pyplot as plt
 import numpy as np
-from skimage import color
+from PIL import Image, ImageDraw, ImageFont
 
 # Palette definition is kept generic so it can be swapped or extended later.
 skin_palette: List[Tuple[str, Tuple[int, int, int], str]] = [
@@ -35,41 +43,103 @@ skin_palette: List[Tuple[str, Tuple[int, int, int], str]] = [
 ]
 
 palette_rgb = np.array([item[1] for item in skin_palette]) / 255.0
-palette_lab = color.rgb2lab(palette_rgb.reshape(1, -1, 3)).reshape(-1, 3)
+palette_lab = np.ascontiguousarray(
+    cv2.cvtColor(palette_rgb.astype(np.float32).reshape(1, -1, 3), cv2.COLOR_RGB2LAB).reshape(-1, 3)
+)
+_PALETTE_LAB_SQ = np.einsum("ij,ij->i", palette_lab, palette_lab)
+
+# One-hot palette -> undertone group membership, so group totals are a single matmul.
+_GROUPS = ["warm", "cool", "neutral"]
+_GROUP_MATRIX = np.zeros((len(skin_palette), len(_GROUPS)), dtype=np.float32)
+for _i, (_name, _rgb, _group) in enumerate(skin_palette):
+    _GROUP_MATRIX[_i, _GROUPS.index(_group)] = 1.0
 
 mp_face_mesh = mp.solutions.face_mesh
-_face_mesh = mp_face_mesh.FaceMesh(static_image_mode=True, refine_landmarks=False)
+# FaceMesh is not thread-safe, so each instance serves one caller at a time. Instances are
+# pooled instead of created per call (graph setup dominates a single inference); the
+# semaphore caps how many exist. static_image_mode stays on because consecutive uploads
+# may be different people, so tracking state must not carry over between requests.
+_FACE_MESH_POOL_SIZE = 4
+_face_mesh_pool: "queue.LifoQueue[Any]" = queue.LifoQueue()
+_face_mesh_slots = threading.BoundedSemaphore(_FACE_MESH_POOL_SIZE)
+
+
+@contextmanager
+def _face_mesh() -> Iterator[Any]:
+    with _face_mesh_slots:
+        try:
+            face_mesh = _face_mesh_pool.get_nowait()
+        except queue.Empty:
+            face_mesh = mp_face_mesh.FaceMesh(
+                static_image_mode=True, max_num_faces=1, refine_landmarks=False
+            )
+        try:
+            yield face_mesh
+        finally:
+            _face_mesh_pool.put(face_mesh)
+
+
+def warm_up() -> None:
+    """Builds one FaceMesh ahead of time so the first request skips graph setup."""
+    with _face_mesh():
+        pass
+
+
+# The rose plot is drawn directly with Pillow; matplotlib's layout and text machinery
+# cost far more than the dozen wedges it actually renders.
+_ROSE_SIZE = 560
+_ROSE_CENTER = (_ROSE_SIZE // 2, _ROSE_SIZE // 2 + 10)
+_ROSE_RADIUS = 210
+_ROSE_GRID_RINGS = 5
+_ROSE_GRID_COLOR = (176, 176, 176)
+_ROSE_FONT = ImageFont.load_default(size=12)
+_ROSE_TITLE_FONT = ImageFont.load_default(size=16)
+_ROSE_ANGLES = np.linspace(0, 2 * np.pi, len(skin_palette), endpoint=False)
+_ROSE_COLORS = [rgb for (_, rgb, _) in skin_palette]
+_ROSE_LABELS = [name for (name, _, _) in skin_palette]
+_ROSE_WIDTH = 2 * np.pi / len(skin_palette)
 
 ASSETS_DIR = Path(__file__).resolve().parent.parent / "assets"
 DOCTOR_RULES_PATH = ASSETS_DIR / "doctor.json"
 
-with open(DOCTOR_RULES_PATH, "r", encoding="utf-8") as f:
-    DOCTOR_RULES = json.load(f)
+# Landmarks sampled for skin colour: everything except the mouth and eye regions.
+_SKIN_KEEP_MASK = np.ones(468, dtype=bool)
+_SKIN_KEEP_MASK[list(range(61, 89)) + list(range(33, 133))] = False
+
+# Parsed once per process; requests only iterate the precompiled _COMPILED_RULES below.
+DOCTOR_RULES = json.loads(DOCTOR_RULES_PATH.read_bytes())
 
 
 def extract_skin_features(roi: np.ndarray) -> Dict[str, float]:
-    roi = cv2.resize(roi, (200, 200))
+    # Only the per-channel statistics are used, so shrink large ROIs to bound the work but
+    # never upscale: interpolated pixels add cost without adding information.
+    if roi.shape[0] * roi.shape[1] > 200 * 200:
+        roi = cv2.resize(roi, (200, 200), interpolation=cv2.INTER_AREA)
 
+    # One fused reduction per image instead of a separate numpy pass per statistic.
     hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    saturation = hsv[:, :, 1].mean() / 255
-    brightness = hsv[:, :, 2].mean() / 255
+    hsv_mean = cv2.mean(hsv)
+    saturation = hsv_mean[1] / 255
+    brightness = hsv_mean[2] / 255
 
     lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
-    L = lab[:, :, 0].mean() / 255
-    a = (lab[:, :, 1].mean() - 128) / 128
-    b = (lab[:, :, 2].mean() - 128) / 128
-    contrast = lab[:, :, 0].std() / 255
+    lab_mean, lab_std = cv2.meanStdDev(lab)
+    L = lab_mean[0, 0] / 255
+    a = (lab_mean[1, 0] - 128) / 128
+    b = (lab_mean[2, 0] - 128) / 128
+    contrast = lab_std[0, 0] / 255
 
-    r = roi[:, :, 2].mean() / 255
-    g = roi[:, :, 1].mean() / 255
-    bl = roi[:, :, 0].mean() / 255
+    bgr_mean = cv2.mean(roi)
+    r = bgr_mean[2] / 255
+    g = bgr_mean[1] / 255
+    bl = bgr_mean[0] / 255
 
     redness = a
     yellow_bias = b
     cyan_bias = -(a + b) / 2
 
-    red_map = (lab[:, :, 1] - 128) / 128
-    red_patch_var = float(np.std(red_map))
+    # std((a - 128) / 128) == std(a) / 128
+    red_patch_var = float(lab_std[1, 0] / 128)
 
     deviations = [
         abs(redness),
@@ -97,43 +167,60 @@ def extract_skin_features(roi: np.ndarray) -> Dict[str, float]:
     }
 
 
+_COND_RE = re.compile(r"(<=|>=|<|>)\s*([-\d\.]+)")
+
+
 def _parse_condition(condition: str) -> Tuple[str, float]:
-    m = re.match(r"(<=|>=|<|>)\s*([-\d\.]+)", condition.strip())
+    m = _COND_RE.match(condition.strip())
     if not m:
         raise ValueError(f"Invalid condition format: {condition}")
     op, val = m.group(1), float(m.group(2))
     return op, val
 
 
-def _eval_condition(value: float, op: str, threshold: float) -> bool:
+_CONDITION_OPS: Dict[str, Callable[[float, float], bool]] = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+def _eval_condition(value: float, op: Callable[[float, float], bool], threshold: float) -> bool:
     # Scale to percentage when the rule threshold looks like a percentage.
     if value <= 1.0 and abs(threshold) > 1.2:
         value = value * 100
-    match op:
-        case "<":
-            return value < threshold
-        case ">":
-            return value > threshold
-        case "<=":
-            return value <= threshold
-        case ">=":
-            return value >= threshold
-    return False
+    return op(value, threshold)
+
+
+# Rules are static, so parse every condition once at import instead of per request.
+_COMPILED_RULES: List[Tuple[str, str, str, Callable[[float, float], bool], float, str, str]] = []
+for _rule_id, _rule in DOCTOR_RULES.items():
+    _op, _threshold = _parse_condition(_rule["condition"])
+    _COMPILED_RULES.append(
+        (
+            _rule_id,
+            _rule.get("feature"),
+            _rule["condition"],
+            _CONDITION_OPS[_op],
+            _threshold,
+            _rule.get("explanation", ""),
+            _rule.get("advice", ""),
+        )
+    )
 
 
 def _select_rule(features: Dict[str, float]) -> Dict[str, Any]:
-    for rule_id, rule in DOCTOR_RULES.items():
-        feat = rule.get("feature")
+    for rule_id, feat, condition, op, threshold, explanation, advice in _COMPILED_RULES:
         if feat not in features:
             continue
-        op, threshold = _parse_condition(rule["condition"])
         if _eval_condition(features[feat], op, threshold):
             return {
                 "rule_id": rule_id,
                 "feature": feat,
-                "condition": rule["condition"],
-                "explanation": rule.get("explanation", ""),
-                "advice": rule.get("advice", ""),
+                "condition": condition,
+                "explanation": explanation,
+                "advice": advice,
             }
     return {
         "rule_id": "default",
@@ -144,30 +231,29 @@ def _select_rule(features: Dict[str, float]) -> Dict[str, Any]:
     }
 
 
-def _extract_skin_pixels(img: np.ndarray, landmarks: Any) -> np.ndarray:
-    h, w, _ = img.shape
-    mouth = list(range(61, 89))
-    eyes = list(range(33, 133))
-    exclude = set(mouth + eyes)
+def _landmarks_to_xy(landmarks: Any, w: int, h: int) -> np.ndarray:
+    """Converts normalized landmarks into an (N, 2) int32 array of pixel coordinates."""
+    points = landmarks.landmark
+    coords = np.fromiter(
+        (c for lm in points for c in (lm.x, lm.y)), dtype=np.float64, count=len(points) * 2
+    ).reshape(-1, 2)
+    coords[:, 0] *= w
+    coords[:, 1] *= h
+    return coords.astype(np.int32)
 
-    skin_pixels = []
-    for idx, lm in enumerate(landmarks.landmark):
-        if idx in exclude:
-            continue
-        x = int(lm.x * w)
-        y = int(lm.y * h)
-        if 0 <= x < w and 0 <= y < h:
-            skin_pixels.append(img[y, x])
 
-    return np.array(skin_pixels)
+def _extract_skin_pixels(img: np.ndarray, xy: np.ndarray) -> np.ndarray:
+    h, w, _ = img.shape
+    xs, ys = xy[:, 0], xy[:, 1]
+    keep = _SKIN_KEEP_MASK[: len(xy)] & (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    return img[ys[keep], xs[keep]]
 
 
-def _face_roi(img: np.ndarray, landmarks: Any) -> np.ndarray:
+def _face_roi(img: np.ndarray, xy: np.ndarray) -> np.ndarray:
     h, w, _ = img.shape
-    xs = [int(lm.x * w) for lm in landmarks.landmark]
-    ys = [int(lm.y * h) for lm in landmarks.landmark]
-    x1, x2 = max(min(xs), 0), min(max(xs), w - 1)
-    y1, y2 = max(min(ys), 0), min(max(ys), h - 1)
+    (min_x, min_y), (max_x, max_y) = xy.min(axis=0), xy.max(axis=0)
+    x1, x2 = max(int(min_x), 0), min(int(max_x), w - 1)
+    y1, y2 = max(int(min_y), 0), min(int(max_y), h - 1)
 
     pad_x = int((x2 - x1) * 0.05)
     pad_y = int((y2 - y1) * 0.05)
@@ -182,80 +268,168 @@ def _face_roi(img: np.ndarray, landmarks: Any) -> np.ndarray:
 
 
 def _palette_weights(skin_pixels: np.ndarray) -> Tuple[List[float], int, Dict[str, float]]:
-    skin_rgb = skin_pixels[:, ::-1] / 255.0  # BGR to RGB
-    skin_lab = color.rgb2lab(skin_rgb)
-    user_lab = np.mean(skin_lab, axis=0)
-
-    deltas = np.linalg.norm(palette_lab - user_lab, axis=1)
-    best_idx = int(np.argmin(deltas))
+    # Only the Lab of the mean skin colour is needed, so average in BGR and convert a
+    # single pixel. This is not identical to the mean of per-pixel Labs, but the
+    # difference is far below the spacing between palette entries.
+    # cv2.mean streams the uint8 pixels once without a float copy of the buffer.
+    mean_bgr = np.float32(cv2.mean(skin_pixels.reshape(-1, 1, 3))[:3]) / 255.0
+    # OpenCV's float path yields CIE Lab with L in 0..100, matching palette_lab.
+    user_lab = cv2.cvtColor(mean_bgr.reshape(1, 1, 3), cv2.COLOR_BGR2LAB).reshape(3)
+
+    # Expanded ||p - u||^2 against precomputed ||p||^2; argmin needs no sqrt.
+    sq_deltas = _PALETTE_LAB_SQ - 2 * (palette_lab @ user_lab) + user_lab @ user_lab
+    best_idx = int(np.argmin(sq_deltas))
+    deltas = np.sqrt(np.maximum(sq_deltas, 0, out=sq_deltas), out=sq_deltas)
 
     eps = 1e-6
     weights = 1 / (deltas + eps)
     weights = weights / weights.sum()
 
-    group_sum = {"warm": 0.0, "cool": 0.0, "neutral": 0.0}
-    for (_name, _rgb, group), weight in zip(skin_palette, weights):
-        group_sum[group] += float(weight)
+    group_weights = weights @ _GROUP_MATRIX
+    group_sum = {group: float(group_weights[i]) for i, group in enumerate(_GROUPS)}
 
     return weights.tolist(), best_idx, group_sum
 
 
-def analyze_face_color(img: np.ndarray) -> Dict[str, Any]:
+def analyze_face_color(img: np.ndarray, include_rose_plot: bool = True) -> Dict[str, Any]:
     """
     Accepts an OpenCV BGR image and returns a dict with analysis details.
+    Pass include_rose_plot=False to skip rendering the rose plot image.
     """
     h, w, _ = img.shape
-    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = _face_mesh.process(rgb_img)
+    rgb_img = img[..., ::-1]  # BGR to RGB view, no intermediate copy
+    with _face_mesh() as face_mesh:
+        results = face_mesh.process(rgb_img)
 
     if not results.multi_face_landmarks:
         return {"status": "error", "message": "No face detected in the image."}
 
     landmarks = results.multi_face_landmarks[0]
-    skin_pixels = _extract_skin_pixels(img, landmarks)
+    xy = _landmarks_to_xy(landmarks, w, h)
+    skin_pixels = _extract_skin_pixels(img, xy)
     if skin_pixels.size == 0:
         return {"status": "error", "message": "Face detected, but no valid skin pixels found."}
 
     weights, best_idx, group_sum = _palette_weights(skin_pixels)
-    rose_plot = generate_rose_plot_base64(skin_palette, weights)
+    # Kept as a Pillow image: the card generator composites it directly, so encoding a PNG
+    # here only to decode it again there would be wasted work.
+    rose_plot = generate_rose_plot_image(skin_palette, weights) if include_rose_plot else None
 
-    roi = _face_roi(img, landmarks)
+    roi = _face_roi(img, xy)
     features = extract_skin_features(roi)
     matched_rule = _select_rule(features)
 
     return {
         "status": "analysis_complete",
         "result": matched_rule,
-        "_analysis_rose_plot_base64": rose_plot,
+        "_analysis_rose_plot_image": rose_plot,
         "_palette_best_idx": best_idx,
         "_palette_group_sum": group_sum,
     }
 
 
+@lru_cache(maxsize=1)
+def _get_process_pool() -> ProcessPoolExecutor:
+    # FaceMesh cannot batch internally, so scale out across processes, one warm instance each.
+    # Spawn rather than fork: the parent may already be running MediaPipe's inference threads.
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_up,
+    )
+
+
+def analyze_face_color_batch(
+    imgs: List[np.ndarray], include_rose_plot: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Runs analyze_face_color over several images in worker processes.
+    Results are returned in input order.
+    """
+    analyze = partial(analyze_face_color, include_rose_plot=include_rose_plot)
+    if len(imgs) <= 1:
+        return [analyze(img) for img in imgs]
+    return list(_get_process_pool().map(analyze, imgs))
+
+
+def generate_rose_plot_image(
+    palette: List[Tuple[str, Tuple[int, int, int], str]], weights: List[float]
+) -> Image.Image:
+    """Generates a radial bar plot as an in-memory RGB image."""
+    if palette is skin_palette:
+        angles, colors, labels, width = _ROSE_ANGLES, _ROSE_COLORS, _ROSE_LABELS, _ROSE_WIDTH
+    else:
+        n = len(palette)
+        angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+        colors = [rgb for (_, rgb, _) in palette]
+        labels = [name for (name, _, _) in palette]
+        width = 2 * np.pi / n
+
+    img = Image.new("RGB", (_ROSE_SIZE, _ROSE_SIZE), "white")
+    draw = ImageDraw.Draw(img)
+    cx, cy = _ROSE_CENTER
+    radius = _ROSE_RADIUS
+
+    # Leave some headroom above the longest bar, like an autoscaled polar axis.
+    peak = max(weights, default=0.0)
+    scale = radius / (peak * 1.1) if peak > 0 else 0.0
+
+    # Angles run counter-clockwise from 3 o'clock; Pillow measures clockwise.
+    half_width = math.degrees(width) / 2
+    for angle, weight, color in zip(angles, weights, colors):
+        r = weight * scale
+        if r <= 0:
+            continue
+        center_deg = -math.degrees(angle)
+        draw.pieslice(
+            (cx - r, cy - r, cx + r, cy + r),
+            start=center_deg - half_width,
+            end=center_deg + half_width,
+            fill=tuple(color),
+            outline="white",
+        )
+
+    for k in range(1, _ROSE_GRID_RINGS + 1):
+        r = radius * k / _ROSE_GRID_RINGS
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), outline=_ROSE_GRID_COLOR)
+    for angle, label in zip(angles, labels):
+        cos_a, sin_a = math.cos(angle), math.sin(angle)
+        draw.line((cx, cy, cx + radius * cos_a, cy - radius * sin_a), fill=_ROSE_GRID_COLOR)
+        draw.text(
+            (cx + (radius + 28) * cos_a, cy - (radius + 18) * sin_a),
+            label,
+            font=_ROSE_FONT,
+            fill="black",
+            anchor="mm",
+        )
+    draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), outline="black")
+    draw.text((cx, 12), "Skin Tone Rose Diagram", font=_ROSE_TITLE_FONT, fill="black", anchor="mt")
+
+    return img
+
+
+def generate_rose_plot_bytes(
+    palette: List[Tuple[str, Tuple[int, int, int], str]], weights: List[float]
+) -> bytes:
+    """Generates a radial bar plot as raw PNG bytes."""
+    buf = io.BytesIO()
+    generate_rose_plot_image(palette, weights).save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
 def generate_rose_plot_base64(
     palette: List[Tuple[str, Tuple[int, int, int], str]], weights: List[float]
 ) -> str:
     """Generates a radial bar plot encoded in base64."""
-    n = len(palette)
-    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
-    palette_rgb = np.array([item[1] for item in palette]) / 255.0
-
-    plt.figure(figsize=(6, 6))
-    ax = plt.subplot(111, polar=True)
-    ax.bar(angles, weights, width=2 * np.pi / n, color=palette_rgb, edgecolor="white")
-    ax.set_xticks(angles)
-    ax.set_xticklabels([name for (name, _, _) in palette], fontsize=9)
-    ax.set_yticklabels([])
-    ax.set_title("Skin Tone Rose Diagram", va="bottom")
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight")
-    plt.close()
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+    return base64.b64encode(generate_rose_plot_bytes(palette, weights)).decode("utf-8")
 
 
 __all__ = [
     "analyze_face_color",
+    "analyze_face_color_batch",
     "generate_rose_plot_base64",
+    "generate_rose_plot_bytes",
+    "generate_rose_plot_image",
     "skin_palette",
+    "warm_up",
 ]
@@ -1,17 +1,25 @@
 from datetime import datetime
-from sqlmodel import Session, select
+from typing import List, Sequence, Type
+from sqlalchemy import func, insert
+from sqlmodel import Session, SQLModel, select
 from app.database import engine, create_db_and_tables
 from app.models import User, UserRole, Appointment, AppointmentStatus, AnalysisRecord
 
 
+def bulk_insert(session: Session, model: Type[SQLModel], objs: Sequence[SQLModel]) -> List[int]:
+    """以單一 INSERT ... RETURNING 寫入多筆資料，依傳入順序回傳新主鍵"""
+    rows = [obj.model_dump(exclude={"id"}) for obj in objs]
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(session.scalars(stmt, rows))
+
+
 def create_fake_data():
     # 1. 確保資料表存在
     create_db_and_tables()
 
     with Session(engine) as session:
         # 以現有人數做 offset，避免 username 唯一鍵衝突
-        existing_users = session.exec(select(User)).all()
-        user_offset = len(existing_users)
+        user_offset = session.exec(select(func.count()).select_from(User)).one()
 
         print("開始插入測試資料...")
 
@@ -39,11 +47,9 @@ def create_fake_data():
                 department="小兒科",
             ),
         ]
-        session.add_all(doctors)
+        doctor_ids = bulk_insert(session, User, doctors)
         session.commit()
-        for doc in doctors:
-            session.refresh(doc)
-        print(f"已新增 {len(doctors)} 位醫師（累積使用者: {len(existing_users) + len(doctors)}）")
+        print(f"已新增 {len(doctors)} 位醫師（累積使用者: {user_offset + len(doctors)}）")
 
         # --- 3. 建立病患 ---
         patients = [
@@ -66,65 +72,63 @@ def create_fake_data():
                 role=UserRole.PATIENT,
             ),
         ]
-        session.add_all(patients)
+        patient_ids = bulk_insert(session, User, patients)
         session.commit()
-        for p in patients:
-            session.refresh(p)
         print(f"已新增 {len(patients)} 位病患")
 
         # --- 4. 建立預約 ---
         today = datetime.now().date()
         appointments = [
             Appointment(
-                patient_id=patients[0].id,
-                doctor_id=doctors[0].id,
+                patient_id=patient_ids[0],
+                doctor_id=doctor_ids[0],
                 date=str(today),
                 time="09:00",
                 department="內科",
                 status=AppointmentStatus.PENDING,
             ),
             Appointment(
-                patient_id=patients[1].id,
-                doctor_id=doctors[0].id,
+                patient_id=patient_ids[1],
+                doctor_id=doctor_ids[0],
                 date=str(today),
                 time="10:00",
                 department="內科",
                 status=AppointmentStatus.PENDING,
             ),
             Appointment(
-                patient_id=patients[2].id,
-                doctor_id=doctors[1].id,
+                patient_id=patient_ids[2],
+                doctor_id=doctor_ids[1],
                 date=str(today),
                 time="14:00",
                 department="外科",
                 status=AppointmentStatus.COMPLETED,
             ),
             Appointment(
-                patient_id=patients[0].id,
-                doctor_id=doctors[2].id,
+                patient_id=patient_ids[0],
+                doctor_id=doctor_ids[2],
                 date=str(today),
                 time="15:00",
                 department="小兒科",
                 status=AppointmentStatus.CANCELLED,
             ),
             Appointment(
-                patient_id=patients[1].id,
-                doctor_id=doctors[2].id,
+                patient_id=patient_ids[1],
+                doctor_id=doctor_ids[2],
                 date=str(today),
                 time="16:00",
                 department="小兒科",
                 status=AppointmentStatus.PENDING,
             ),
         ]
-        session.add_all(appointments)
+        bulk_insert(session, Appointment, appointments)
         session.commit()
         print(f"已新增 {len(appointments)} 筆預約資料")
 
         # --- 5. 建立分析紀錄 (AnalysisRecord) ---
         sample_analysis = AnalysisRecord(
-            patient_id=patients[0].id,
+            patient_id=patient_ids[0],
             analysis_type="skin_tone",
-            analysis_result='{"best_match": "Warm Sand", "warm_cool_neutral_base": {"warm": 55.2, "cool": 18.3, "neutral": 26.5}}',
+            analysis_result={"best_match": "Warm Sand", "warm_cool_neutral_base": {"warm": 55.2, "cool": 18.3, "neutral": 26.5}},
         )
         session.add(sample_analysis)
         session.commit()
@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import Appointment, Symptom, User, UserRole
+from app.services import ai_service
+
+
+class GenerateAiSummaryTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        SQLModel.metadata.create_all(engine)
+        self.session = Session(engine)
+        patient = User(username="p", password_hash="x", full_name="病患", role=UserRole.PATIENT)
+        doctor = User(username="d", password_hash="x", full_name="醫師", role=UserRole.DOCTOR)
+        self.session.add_all([patient, doctor])
+        self.session.commit()
+        self.appointment = Appointment(
+            patient_id=patient.id, doctor_id=doctor.id, date="2026-01-01", time="10:00", department="內科"
+        )
+        self.session.add(self.appointment)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _summarize(self, request_summary):
+        with patch.object(ai_service, "_request_summary", request_summary):
+            return asyncio.run(ai_service.generate_ai_summary(self.appointment.id, self.session))
+
+    def test_short_but_complete_symptom_report_reaches_gemini(self):
+        self.session.add(
+            Symptom(
+                appointment_id=self.appointment.id,
+                description="頭痛",
+                symptoms=["頭痛", "發燒"],
+                duration="3天",
+                severity="中",
+            )
+        )
+        self.session.commit()
+        request_summary = AsyncMock(
+            return_value={"summary": "S", "disease_prediction": "D", "advice": "A"}
+        )
+
+        result = self._summarize(request_summary)
+
+        request_summary.assert_awaited_once()
+        self.assertIn("頭痛", request_summary.await_args.args[0])
+        self.assertEqual(result, ("S", "D", "A"))
+
+    def test_appointment_without_patient_input_skips_gemini(self):
+        request_summary = AsyncMock()
+
+        result = self._summarize(request_summary)
+
+        request_summary.assert_not_awaited()
+        self.assertEqual(result, ai_service.INSUFFICIENT_CONTEXT_RESULT)
+
+
+if __name__ == "__main__":
+    unittest.main()